@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 import os
 from letta_client import Letta
+from letta_client.core import ApiError
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
-from datetime import datetime
+from letta_gate import AgentGate, LettaUnavailable
+from profiling import ProfileStore, StackSampler
+from search_index import SearchIndex, tokenize
+from datetime import datetime, timezone
+import hmac
 import json 
+import random
+import tempfile
+import threading
+import time
 
 # Load env variables
 load_dotenv()
@@ -49,12 +58,15 @@ def _create_folder(folder_name: str, emoji: str = ""):
         return f"Folder '{folder_name}' already exists"
     
     # Create folder
+    search_index = _installed_search_index()
     folder_ref.set({
         'id': folder_id,
         'name': folder_name,
         'emoji': emoji,
         'created_at': firestore.SERVER_TIMESTAMP
     })
+    _index_folder(folder_id, folder_name)
+    _search_data_changed(search_index)
     
     return f"Created folder {emoji} {folder_name}".strip()
 
@@ -70,6 +82,7 @@ def _create_task(task_name: str, folder_name: str, recurrence: str = "once",
         return f"Folder '{folder_name}' doesn't exist"
     
     # Create task
+    search_index = _installed_search_index()
     task_ref = db.collection('tasks').document()
     task_ref.set({
         'name': task_name,
@@ -80,6 +93,8 @@ def _create_task(task_name: str, folder_name: str, recurrence: str = "once",
         'duration': duration,
         'created_at': firestore.SERVER_TIMESTAMP
     })
+    _index_task(task_ref.id, task_name, folder_id)
+    _search_data_changed(search_index)
     
     return f"Created task '{task_name}' in {folder_name}"
 
@@ -135,7 +150,10 @@ def _delete_task(task_name: str):
     
     deleted = False
     for task in tasks:
+        search_index = _installed_search_index()
         task.reference.delete()
+        _unindex('task', task.id)
+        _search_data_changed(search_index)
         deleted = True
         break
     
@@ -153,12 +171,16 @@ def _delete_folder(folder_name: str):
         return f"Folder '{folder_name}' doesn't exist"
     
     # Delete all tasks in folder
+    search_index = _installed_search_index()
     tasks = db.collection('tasks').where('folder', '==', folder_id).stream()
     for task in tasks:
         task.reference.delete()
+        _unindex('task', task.id)
     
     # Delete folder
     folder_ref.delete()
+    _unindex('folder', folder_id)
+    _search_data_changed(search_index)
     
     return f"Deleted folder '{folder_name}'"
 
@@ -176,7 +198,10 @@ def _move_task(task_name: str, destination_folder: str):
     
     moved = False
     for task in tasks:
+        search_index = _installed_search_index()
         task.reference.update({'folder': dest_id})
+        _index_task(task.id, task_name, dest_id)
+        _search_data_changed(search_index)
         moved = True
         break
     
@@ -201,6 +226,7 @@ def _edit_folder_name(old_name: str, new_name: str, new_emoji: str = None):
     old_data = old_ref.get().to_dict()
     
     # Create new folder
+    search_index = _installed_search_index()
     new_data = {
         'id': new_id,
         'name': new_name,
@@ -208,14 +234,19 @@ def _edit_folder_name(old_name: str, new_name: str, new_emoji: str = None):
         'created_at': old_data.get('created_at')
     }
     db.collection('folders').document(new_id).set(new_data)
+    _index_folder(new_id, new_name)
     
     # Update all tasks
     tasks = db.collection('tasks').where('folder', '==', old_id).stream()
     for task in tasks:
         task.reference.update({'folder': new_id})
+        _index_task(task.id, task.to_dict().get('name', ''), new_id)
     
     # Delete old folder
-    old_ref.delete()
+    if new_id != old_id:
+        old_ref.delete()
+        _unindex('folder', old_id)
+    _search_data_changed(search_index)
     
     return f"Renamed folder to '{new_name}'"
 
@@ -246,7 +277,15 @@ def _edit_task(old_task_name: str, new_task_name: str = None, new_folder: str =
             updates['duration'] = new_duration
         
         if updates:
+            # Only name and folder are indexed; other edits don't touch search
+            indexed = 'name' in updates or 'folder' in updates
+            search_index = _installed_search_index()
             task.reference.update(updates)
+            if indexed:
+                task_data = task.to_dict()
+                _index_task(task.id, updates.get('name', task_data.get('name', '')),
+                            updates.get('folder', task_data.get('folder')))
+                _search_data_changed(search_index)
             updated = True
             final_name = new_task_name if new_task_name else old_task_name
             return f"Updated '{final_name}'"
@@ -255,6 +294,164 @@ def _edit_task(old_task_name: str, new_task_name: str = None, new_folder: str =
         return f"Task '{old_task_name}' not found"
 
 
+# ============================================
+# SEARCH INDEX
+# ============================================
+
+# In-memory inverted index over task and folder names (see search_index.py).
+# Each Gunicorn worker holds its own copy, kept current by the helpers above.
+# Every write also bumps a version counter in Firestore (best effort); a search
+# that finds the counter ahead of its copy (another worker wrote) rebuilds
+# first. One rebuild runs at a time per worker, scanning outside _search_lock
+# and swapping the result in, so writes never wait on it. SEARCH_INDEX_TTL is a
+# fallback for writes made outside this service.
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "60"))
+
+_search_lock = threading.Lock()
+_search_rebuild_lock = threading.Lock()
+_search_index = None       # SearchIndex, built on first search
+_search_version = None     # value of the Firestore counter the index reflects
+_search_built_at = None
+_search_version_ref = db.collection('meta').document('search_index')
+
+
+def _read_search_version():
+    snapshot = _search_version_ref.get()
+    if not snapshot.exists:
+        return 0
+    return snapshot.to_dict().get('version', 0)
+
+
+@firestore.transactional
+def _bump_search_version(transaction):
+    snapshot = _search_version_ref.get(transaction=transaction)
+    previous = snapshot.to_dict().get('version', 0) if snapshot.exists else 0
+    transaction.set(_search_version_ref, {'version': previous + 1})
+    return previous
+
+
+def _installed_search_index():
+    """The index a write is about to update; pass it to _search_data_changed"""
+    with _search_lock:
+        return _search_index
+
+
+def _search_data_changed(search_index):
+    """Record a task/folder write so other workers know to rebuild.
+
+    Best effort: a failure here must never fail the write itself, so it just
+    marks this worker's index stale.
+    """
+    global _search_version
+
+    try:
+        previous = _bump_search_version(db.transaction())
+    except Exception as e:
+        print(f"⚠️  Could not bump search index version: {e}")
+        with _search_lock:
+            _search_version = None
+        return
+
+    with _search_lock:
+        # Only advance if nothing else was written since our index was current
+        # and no rebuild swapped in an index that missed this write; otherwise
+        # leave it behind so the next search rebuilds
+        if _search_index is search_index and _search_version == previous:
+            _search_version = previous + 1
+
+
+def _build_search_index():
+    """Rebuild the whole index from Firestore"""
+    global _search_index, _search_version, _search_built_at
+
+    # Read the version before scanning: writes that land during the scan bump
+    # it past this value and trigger another rebuild
+    version = _read_search_version()
+    index = SearchIndex()
+
+    for folder in db.collection('folders').stream():
+        folder_data = folder.to_dict()
+        index.add('folder', folder.id, folder_data.get('name', folder.id))
+
+    for task in db.collection('tasks').stream():
+        task_data = task.to_dict()
+        index.add('task', task.id, task_data.get('name', ''), task_data.get('folder'))
+
+    with _search_lock:
+        _search_index = index
+        _search_version = version
+        _search_built_at = time.monotonic()
+
+    return index
+
+
+def _current_search_index():
+    with _search_lock:
+        index, version, built_at = _search_index, _search_version, _search_built_at
+
+    if (index is not None and version is not None
+            and time.monotonic() - built_at <= SEARCH_INDEX_TTL
+            and _read_search_version() == version):
+        return index
+
+    # Single-flight: concurrent searches wait for one rebuild instead of each
+    # scanning the collections
+    with _search_rebuild_lock:
+        with _search_lock:
+            if _search_index is not None and _search_built_at != built_at:
+                return _search_index
+        return _build_search_index()
+
+
+def _index_task(task_id: str, task_name: str, folder_id: str):
+    """Add or refresh a task in the search index"""
+    with _search_lock:
+        if _search_index is not None:
+            _search_index.add('task', task_id, task_name, folder_id)
+
+
+def _index_folder(folder_id: str, folder_name: str):
+    """Add or refresh a folder in the search index"""
+    with _search_lock:
+        if _search_index is not None:
+            _search_index.add('folder', folder_id, folder_name)
+
+
+def _unindex(kind: str, doc_id: str):
+    """Drop a task or folder from the search index"""
+    with _search_lock:
+        if _search_index is not None:
+            _search_index.remove(kind, doc_id)
+
+
+def _search(query: str, limit: int = 10):
+    """Rank tasks and folders whose names match the query"""
+    if not tokenize(query):
+        return []
+
+    index = _current_search_index()
+
+    with _search_lock:
+        return index.search(query, limit)
+
+
+def _search_tasks(query: str):
+    """Search task and folder names"""
+    results = _search(query)
+
+    if not results:
+        return f"Nothing found for '{query}'"
+
+    lines = []
+    for r in results:
+        if r['type'] == 'folder':
+            lines.append(f"📁 {r['name']}")
+        else:
+            lines.append(f"• {r['name']} (in {r['folder_name'] or r['folder']})")
+
+    return f"Results for '{query}':\n" + "\n".join(lines)
+
+
 # ============================================
 # LETTA TOOL FUNCTIONS (MAKE HTTP CALLS)
 # ============================================
@@ -435,6 +632,26 @@ def list_all_folders():
     return response.json()["result"]
 
 
+def search_tasks(query: str):
+    """
+    Search task and folder names by keyword.
+    
+    Results can briefly miss a task created moments ago. If nothing is found
+    for something the user just added, check get_folder_contents instead.
+    
+    Args:
+        query: Words to look for, e.g. "dentist" or "grocery shopping"
+    
+    Returns:
+        Matching tasks and folders, best matches first
+    """
+    import requests
+    response = requests.post(f"{BACKEND_URL}/api/search_tasks", json={
+        "query": query
+    })
+    return response.json()["result"]
+
+
 # ============================================
 # API ENDPOINTS FOR LETTA TOOLS TO CALL
 # ============================================
@@ -514,6 +731,78 @@ def api_list_all_folders():
     return jsonify({"result": result})
 
 
+@app.route("/api/search_tasks", methods=["POST"])
+def api_search_tasks():
+    data = request.get_json()
+    result = _search_tasks(data["query"])
+    return jsonify({"result": result})
+
+
+# ============================================
+# LETTA ADMISSION CONTROL
+# ============================================
+
+# Agent calls can take many seconds, and while one runs Letta calls back into
+# /api/* on this service to execute tools. Cap how many agent calls run at once
+# per worker, how many may wait for a slot, and how long each may take, so a
+# slow Letta can't tie up every thread and starve the tool callbacks and the
+# other routes (see letta_gate.py).
+#
+# Deployment: this only works when each worker serves several requests at
+# once. Run Gunicorn with threaded workers (gunicorn.conf.py sets gthread) and
+# more threads than LETTA_MAX_CONCURRENCY + LETTA_MAX_QUEUE, so some threads
+# are always left for callbacks. check_worker_config() refuses to boot a
+# worker that doesn't meet this.
+LETTA_MAX_CONCURRENCY = int(os.getenv("LETTA_MAX_CONCURRENCY", "4"))
+LETTA_MAX_QUEUE = int(os.getenv("LETTA_MAX_QUEUE", "2"))
+LETTA_QUEUE_TIMEOUT = float(os.getenv("LETTA_QUEUE_TIMEOUT", "5"))
+LETTA_TIMEOUT = float(os.getenv("LETTA_TIMEOUT", "20"))
+LETTA_MAX_RETRIES = int(os.getenv("LETTA_MAX_RETRIES", "0"))
+LETTA_BREAKER_THRESHOLD = int(os.getenv("LETTA_BREAKER_THRESHOLD", "5"))
+LETTA_BREAKER_COOLDOWN = float(os.getenv("LETTA_BREAKER_COOLDOWN", "30"))
+
+# Deadline for every Letta call, including agent bootstrap
+LETTA_REQUEST_OPTIONS = {
+    "timeout_in_seconds": LETTA_TIMEOUT,
+    "max_retries": LETTA_MAX_RETRIES
+}
+
+
+def _is_letta_failure(e: Exception):
+    """Client errors (bad request, unknown agent) don't mean Letta is unhealthy"""
+    if isinstance(e, ApiError) and e.status_code is not None:
+        return e.status_code >= 500 or e.status_code == 429
+    return True
+
+
+_letta_gate = AgentGate(
+    max_concurrency=LETTA_MAX_CONCURRENCY,
+    max_queue=LETTA_MAX_QUEUE,
+    queue_timeout=LETTA_QUEUE_TIMEOUT,
+    breaker_threshold=LETTA_BREAKER_THRESHOLD,
+    breaker_cooldown=LETTA_BREAKER_COOLDOWN,
+    is_failure=_is_letta_failure
+)
+
+
+def check_worker_config(request_slots: int):
+    """Called from gunicorn.conf.py when a worker boots"""
+    _letta_gate.check_worker_config(request_slots)
+
+
+def _letta_status():
+    return dict(_letta_gate.status(), timeout=LETTA_TIMEOUT)
+
+
+def _send_agent_message(agent_id_local: str, text: str):
+    """Send a message to the agent through the concurrency gate and circuit breaker"""
+    return _letta_gate.call(lambda: client.agents.messages.create(
+        agent_id=agent_id_local,
+        messages=[{"role": "user", "content": text}],
+        request_options=LETTA_REQUEST_OPTIONS
+    ))
+
+
 # ============================================
 # REGISTER TOOLS WITH LETTA
 # ============================================
@@ -523,14 +812,14 @@ def register_tools():
     functions = [
         create_folder, create_task, move_task, delete_task,
         delete_folder, edit_folder_name, edit_task,
-        get_folder_contents, list_all_folders
+        get_folder_contents, list_all_folders, search_tasks
     ]
 
     print("Registering tools with Letta...")
 
     for func in functions:
         try:
-            t = client.tools.upsert_from_function(func=func)
+            t = client.tools.upsert_from_function(func=func, request_options=LETTA_REQUEST_OPTIONS)
             tools.append(t.id)
             print(f"✅ Registered tool: {t.name} ({t.id})")
         except Exception as e:
@@ -555,7 +844,8 @@ def get_or_create_agent():
 
         for tid in tool_ids:
             try:
-                client.agents.tools.attach(agent_id=agent_id, tool_id=tid)
+                client.agents.tools.attach(agent_id=agent_id, tool_id=tid,
+                                           request_options=LETTA_REQUEST_OPTIONS)
             except:
                 pass
 
@@ -572,7 +862,8 @@ You can create folders, add tasks, move tasks between folders, edit tasks and fo
 and help users stay organized. Always be friendly and concise in your responses."""
             }
         ],
-        tool_ids=tool_ids
+        tool_ids=tool_ids,
+        request_options=LETTA_REQUEST_OPTIONS
     )
 
     agent_id = agent.id
@@ -583,13 +874,134 @@ and help users stay organized. Always be friendly and concise in your responses.
     return agent_id
 
 
+_agent_lock = threading.Lock()
+
+
+def _ensure_agent():
+    """Load or create the agent once per worker, unless Letta is known to be down"""
+    retry_after = _letta_gate.retry_after()
+    if retry_after:
+        raise LettaUnavailable("Letta circuit breaker is open", retry_after)
+
+    with _agent_lock:
+        return agent_id or get_or_create_agent()
+
+
+# ============================================
+# REQUEST PROFILING
+# ============================================
+
+# Opt-in: set PROFILE_SAMPLE_RATE (0-1) to profile that fraction of requests to
+# the routes below. A sampled request has its own thread's stack sampled every
+# PROFILE_INTERVAL_MS (see profiling.py), so concurrent requests and Letta's
+# /api/* callbacks never mix into each other's profiles. Any sampled request
+# slower than PROFILE_THRESHOLD_MS is written to PROFILE_DIR, which keeps the
+# newest PROFILE_BUFFER_SIZE captures and is shared by every worker on the
+# host. /debug/profiles serves them and requires PROFILE_TOKEN; ?format=collapsed
+# returns stacks that flamegraph.pl or speedscope turn into a flame graph.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "1000"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "20"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "voicelog-profiles"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+_PROFILED_PREFIXES = ("/process_command", "/api/", "/folders", "/tasks", "/search")
+_profile_store = ProfileStore(PROFILE_DIR, PROFILE_BUFFER_SIZE) if PROFILE_SAMPLE_RATE > 0 else None
+
+
+@app.before_request
+def _start_profiler():
+    if _profile_store is None or not request.path.startswith(_PROFILED_PREFIXES):
+        return
+    if random.random() >= PROFILE_SAMPLE_RATE:
+        return
+
+    sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    sampler.start()
+    g.sampler = sampler
+    g.profile_started = time.perf_counter()
+
+
+@app.teardown_request
+def _stop_profiler(exc):
+    sampler = g.pop("sampler", None)
+    if sampler is None:
+        return
+
+    sampler.stop()
+    elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+    if elapsed_ms < PROFILE_THRESHOLD_MS:
+        return
+
+    entry = {
+        'method': request.method,
+        'path': request.path,
+        'duration_ms': round(elapsed_ms, 1),
+        'error': repr(exc) if exc else None,
+        'pid': os.getpid(),
+        'samples': sampler.samples,
+        'captured_at': datetime.now(timezone.utc).isoformat(),
+        'summary': sampler.summary(),
+        'stacks': sampler.collapsed()
+    }
+
+    try:
+        profile_id = _profile_store.save(entry)
+    except OSError as e:
+        print(f"⚠️  Could not save profile: {e}")
+        return
+
+    print(f"🐢 Slow request {request.method} {request.path} ({elapsed_ms:.0f} ms), profile {profile_id}")
+
+
+def _debug_authorized():
+    if not PROFILE_TOKEN or _profile_store is None:
+        return False
+    supplied = request.headers.get("X-Debug-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        supplied = auth[len("Bearer "):]
+    return hmac.compare_digest(supplied.encode(), PROFILE_TOKEN.encode())
+
+
+@app.route("/debug/profiles")
+def list_profiles():
+    if not _debug_authorized():
+        return jsonify({"error": "not found"}), 404
+
+    return jsonify({"profiles": _profile_store.list(), "success": True})
+
+
+@app.route("/debug/profiles/<pid>")
+def get_profile(pid):
+    if not _debug_authorized():
+        return jsonify({"error": "not found"}), 404
+
+    entry = _profile_store.get(pid)
+    if entry is None:
+        return jsonify({"error": "not found"}), 404
+
+    if request.args.get("format") == "collapsed":
+        return Response(
+            entry['stacks'] + "\n",
+            mimetype="text/plain",
+            headers={"Content-Disposition": f"attachment; filename={pid}.folded"}
+        )
+
+    profile = {k: v for k, v in entry.items() if k != 'stacks'}
+    return jsonify({"profile": profile, "success": True})
+
+
 # ============================================
 # FLASK ROUTES
 # ============================================
 
 @app.route("/health")
 def health():
-    return jsonify({"status": "healthy", "agent_id": agent_id})
+    letta = _letta_status()
+    status = "healthy" if letta['breaker'] == 'closed' else "degraded"
+    return jsonify({"status": status, "agent_id": agent_id, "letta": letta})
 
 
 @app.route("/process_command", methods=["POST"])
@@ -600,15 +1012,11 @@ def process():
     if not text:
         return jsonify({"error": "empty text"}), 400
 
-    agent_id_local = agent_id or get_or_create_agent()
-
     print(f"📨 Received command: {text}")
 
     try:
-        response = client.agents.messages.create(
-            agent_id=agent_id_local,
-            messages=[{"role": "user", "content": text}]
-        )
+        agent_id_local = agent_id or _ensure_agent()
+        response = _send_agent_message(agent_id_local, text)
 
         final = ""
         for m in response.messages:
@@ -620,6 +1028,12 @@ def process():
 
         return jsonify({"response": final})
 
+    except LettaUnavailable as e:
+        print(f"⏳ Rejected: {e}")
+        resp = jsonify({"error": str(e), "retry_after": e.retry_after})
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp, 503
+
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
@@ -680,6 +1094,18 @@ def all_tasks():
     return jsonify({"tasks": task_list, "success": True})
 
 
+@app.route("/search")
+def search():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "missing q"}), 400
+
+    limit = request.args.get("limit", 10, type=int)
+    results = _search(query, max(1, min(limit, 100)))
+
+    return jsonify({"results": results, "success": True})
+
+
 # ============================================
 # START SERVER
 # ============================================
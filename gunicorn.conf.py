@@ -0,0 +1,26 @@
+"""Gunicorn settings for the VoiceLog backend"""
+
+import os
+
+# While an agent call is in flight, Letta calls back into /api/* on this
+# service to run tools. Threaded workers keep spare threads for those
+# callbacks; app.check_worker_config() refuses to boot a worker without
+# enough of them (more than LETTA_MAX_CONCURRENCY + LETTA_MAX_QUEUE).
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+
+def post_worker_init(worker):
+    from gunicorn.workers.base_async import AsyncWorker
+    from gunicorn.workers.gthread import ThreadWorker
+
+    import app
+
+    if isinstance(worker, ThreadWorker):
+        request_slots = worker.cfg.threads
+    elif isinstance(worker, AsyncWorker):
+        request_slots = worker.cfg.worker_connections
+    else:
+        request_slots = 1
+
+    app.check_worker_config(request_slots)
@@ -0,0 +1,170 @@
+"""Concurrency gate and circuit breaker for Letta agent calls"""
+
+import math
+import threading
+import time
+
+
+class LettaUnavailable(Exception):
+    """Raised when an agent call is rejected before reaching Letta"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AgentGate:
+    """Bounds concurrent agent calls and stops calling Letta while it is failing.
+
+    At most max_concurrency calls run at once and max_queue more may wait up to
+    queue_timeout seconds for a slot; anything beyond that is rejected with
+    LettaUnavailable. After breaker_threshold consecutive failures the breaker
+    opens and rejects calls for breaker_cooldown seconds, then lets a single
+    trial call through: success closes it, failure opens it again.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 2,
+                 queue_timeout: float = 5, breaker_threshold: int = 5,
+                 breaker_cooldown: float = 30, is_failure=None, clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.is_failure = is_failure or (lambda e: True)
+        self.clock = clock
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._pending = 0  # calls running or waiting for a slot
+        self._state = 'closed'  # closed -> open after repeated failures -> half_open trial
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def check_worker_config(self, request_slots: int):
+        """Check a worker with this many request threads can still serve tool callbacks"""
+        needed = self.max_concurrency + self.max_queue
+        if request_slots <= needed:
+            raise RuntimeError(
+                f"Each worker needs more than {needed} threads "
+                f"(LETTA_MAX_CONCURRENCY + LETTA_MAX_QUEUE) so /api/* tool callbacks "
+                f"can run while agent calls are in flight, but it has {request_slots}. "
+                f"Run gunicorn with --worker-class gthread --threads {needed + 2}"
+            )
+
+    def _cooldown_remaining(self):
+        # Call with self._lock held
+        if self._state != 'open':
+            return 0
+        return max(0, self.breaker_cooldown - (self.clock() - self._opened_at))
+
+    def retry_after(self):
+        """Seconds until the breaker lets calls through again, or 0"""
+        with self._lock:
+            return self._cooldown_remaining()
+
+    def status(self):
+        with self._lock:
+            return {
+                'breaker': self._state,
+                'consecutive_failures': self._failures,
+                'retry_after': math.ceil(self._cooldown_remaining()),
+                'in_flight': self._pending,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue
+            }
+
+    def _allow(self):
+        """Admit a call past the breaker; returns True if it is the half-open trial"""
+        with self._lock:
+            if self._state == 'open':
+                remaining = self._cooldown_remaining()
+                if remaining > 0:
+                    raise LettaUnavailable("Letta circuit breaker is open", remaining)
+                self._state = 'half_open'
+
+            if self._state == 'half_open':
+                # Let a single trial call through to see if Letta has recovered
+                if self._trial_in_flight:
+                    raise LettaUnavailable("Letta circuit breaker is half-open", self.queue_timeout)
+                self._trial_in_flight = True
+                return True
+
+            return False
+
+    def _record(self, success, is_trial: bool):
+        """Record a call outcome; None means it was interrupted and says nothing about Letta"""
+        with self._lock:
+            if is_trial:
+                self._trial_in_flight = False
+
+            if success is None:
+                return
+
+            if is_trial:
+                if success:
+                    self._state = 'closed'
+                    self._failures = 0
+                    self._opened_at = None
+                else:
+                    self._failures += 1
+                    self._open()
+                return
+
+            # A call admitted before the breaker tripped says nothing about the
+            # trial; only the trial decides when to close again
+            if self._state != 'closed':
+                return
+
+            if success:
+                self._failures = 0
+                return
+
+            self._failures += 1
+            if self._failures >= self.breaker_threshold:
+                self._open()
+
+    def _open(self):
+        if self._state != 'open':
+            print(f"⚠️  Letta circuit breaker opened after {self._failures} failures")
+        self._state = 'open'
+        self._opened_at = self.clock()
+
+    def call(self, fn):
+        """Run fn() through the concurrency gate and circuit breaker"""
+        retry_after = self.retry_after()
+        if retry_after:
+            raise LettaUnavailable("Letta circuit breaker is open", retry_after)
+
+        with self._lock:
+            if self._pending >= self.max_concurrency + self.max_queue:
+                raise LettaUnavailable("Too many pending commands", self.queue_timeout)
+            self._pending += 1
+
+        try:
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                raise LettaUnavailable("Timed out waiting for a free agent slot", self.queue_timeout)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        try:
+            is_trial = self._allow()
+            success = None
+            try:
+                result = fn()
+                success = True
+                return result
+            except Exception as e:
+                success = not self.is_failure(e)
+                raise
+            finally:
+                # Also runs on BaseException (worker abort, gevent Timeout) so a
+                # half-open trial never leaves the breaker stuck
+                self._record(success, is_trial)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._pending -= 1
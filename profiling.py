@@ -0,0 +1,143 @@
+"""Per-request stack sampling and an on-disk ring of captured profiles"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+_PROFILE_ID_RE = re.compile(r"[0-9a-f]{16}-\d+-[0-9a-f]{6}")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    # Parent directory too, so flask/app.py and our app.py stay apart
+    parent, name = os.path.split(code.co_filename)
+    where = os.path.join(os.path.basename(parent), name)
+    return f"{code.co_name} ({where}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer.
+
+    Only the given thread is looked at, so concurrent requests never leak into
+    its profile. Stacks are counted in collapsed form ("root;caller;leaf"),
+    which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, thread_ident: int, interval: float = 0.005):
+        self.thread_ident = thread_ident
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit: int = 40):
+        """Text table of the functions seen most often, by total and self samples"""
+        total = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            labels = stack.split(";")
+            own[labels[-1]] += count
+            for label in set(labels):
+                total[label] += count
+
+        lines = [
+            f"{self.samples} samples every {self.interval * 1000:g} ms",
+            "",
+            f"{'total':>7} {'self':>7}  function"
+        ]
+        for label, count in total.most_common(limit):
+            lines.append(f"{count:>7} {own[label]:>7}  {label}")
+        return "\n".join(lines)
+
+
+class ProfileStore:
+    """Keeps the newest profiles as JSON files in a directory.
+
+    Every worker on the host writes to and reads from the same directory, so
+    any of them can serve any capture.
+    """
+
+    def __init__(self, directory: str, size: int = 20):
+        self.directory = directory
+        self.size = max(1, size)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, profile_id: str):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _ids(self):
+        # IDs start with a fixed-width hex timestamp, so name order is age order
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-5] for n in names
+                      if n.endswith(".json") and _PROFILE_ID_RE.fullmatch(n[:-5]))
+
+    def save(self, entry: dict):
+        profile_id = f"{time.time_ns():016x}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        entry = dict(entry, id=profile_id)
+
+        tmp = os.path.join(self.directory, f".{profile_id}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(profile_id))
+
+        for old_id in self._ids()[:-self.size]:
+            try:
+                os.remove(self._path(old_id))
+            except FileNotFoundError:
+                pass  # another worker trimmed it first
+
+        return profile_id
+
+    def get(self, profile_id: str):
+        if not _PROFILE_ID_RE.fullmatch(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def list(self):
+        """Newest first, without the bulky summary and stacks"""
+        entries = []
+        for profile_id in reversed(self._ids()):
+            entry = self.get(profile_id)
+            if entry is not None:
+                entries.append({k: v for k, v in entry.items() if k not in ('summary', 'stacks')})
+        return entries
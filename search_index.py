@@ -0,0 +1,138 @@
+"""Inverted index over task and folder names"""
+
+import math
+import re
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "at", "my",
+    "about", "anything", "something", "find", "with", "is", "are"
+}
+_VOWELS = "aeiouy"
+
+
+def _has_vowel(text: str):
+    return any(c in _VOWELS for c in text)
+
+
+def _has_vowel_consonant(text: str):
+    return any(a in _VOWELS and b not in _VOWELS for a, b in zip(text, text[1:]))
+
+
+def _strip_verb_suffix(word: str):
+    # speed, seed, need keep their "eed"; agreed -> agree
+    if word.endswith("eed"):
+        return word[:-1] if _has_vowel_consonant(word[:-3]) else word
+
+    for suffix in ("ing", "ed"):
+        base = word[:-len(suffix)]
+        if word.endswith(suffix) and len(base) >= 3 and _has_vowel(base):
+            # shopping -> shopp -> shop
+            if base[-1] == base[-2] and base[-1] not in "lsz":
+                base = base[:-1]
+            # Stem what's left as if it were the bare word, so "speeding"
+            # and "speed" (or "embedding" and "embed") end up the same
+            return _strip_verb_suffix(base)
+
+    return word
+
+
+def stem(word: str):
+    """Reduce a word to a rough stem so 'meetings' matches 'meeting'"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+
+    word = _strip_verb_suffix(word)
+
+    if word.endswith("y") and len(word) > 3:
+        word = word[:-1] + "i"
+    elif word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+
+    return word
+
+
+def tokenize(text: str):
+    """Split text into lowercase stemmed tokens"""
+    return [stem(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class SearchIndex:
+    """Maps stemmed name tokens to the tasks and folders that contain them"""
+
+    def __init__(self):
+        self.docs = {}      # (kind, id) -> {'type', 'id', 'name', 'folder', 'tokens'}
+        self.postings = {}  # token -> {(kind, id): term frequency}
+
+    def add(self, kind: str, doc_id: str, name: str, folder: str = None):
+        key = (kind, doc_id)
+        self.remove(kind, doc_id)
+        tokens = tokenize(name)
+        self.docs[key] = {
+            'type': kind,
+            'id': doc_id,
+            'name': name,
+            'folder': folder,
+            'tokens': tokens
+        }
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            postings[key] = postings.get(key, 0) + 1
+
+    def remove(self, kind: str, doc_id: str):
+        key = (kind, doc_id)
+        doc = self.docs.pop(key, None)
+        if not doc:
+            return
+        for token in set(doc['tokens']):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[token]
+
+    def search(self, query: str, limit: int = 10):
+        """Rank tasks and folders whose names match the query"""
+        query_tokens = set(tokenize(query))
+        if not query_tokens:
+            return []
+
+        total = len(self.docs) or 1
+        scores = {}
+
+        for token in query_tokens:
+            # Exact stem matches score fully, prefixes ("dent" -> "dentist") at half weight
+            matches = [(token, 1.0)] if token in self.postings else []
+            if len(token) >= 3:
+                matches += [(t, 0.5) for t in self.postings
+                            if t != token and t.startswith(token)]
+
+            for term, weight in matches:
+                postings = self.postings[term]
+                idf = math.log(1 + total / len(postings))
+                for key, tf in postings.items():
+                    scores[key] = scores.get(key, 0.0) + weight * tf * idf
+
+        results = []
+        for key, score in scores.items():
+            doc = self.docs[key]
+            # Favour short names where the query covers most of the title
+            score /= math.sqrt(len(doc['tokens']) or 1)
+            folder = self.docs.get(('folder', doc['folder'])) if doc['folder'] else None
+            results.append({
+                'type': doc['type'],
+                'id': doc['id'],
+                'name': doc['name'],
+                'folder': doc['folder'],
+                'folder_name': folder['name'] if folder else None,
+                'score': round(score, 4)
+            })
+
+        results.sort(key=lambda r: (-r['score'], r['name']))
+        return results[:limit]
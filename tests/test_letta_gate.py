@@ -0,0 +1,170 @@
+import threading
+
+import pytest
+
+from letta_gate import AgentGate, LettaUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ClientError(Exception):
+    pass
+
+
+def fail():
+    raise TimeoutError()
+
+
+def client_error():
+    raise ClientError()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_gate(clock, max_concurrency=1):
+    return AgentGate(
+        max_concurrency=max_concurrency, max_queue=1, queue_timeout=0.05,
+        breaker_threshold=2, breaker_cooldown=30,
+        is_failure=lambda e: not isinstance(e, ClientError), clock=clock
+    )
+
+
+@pytest.fixture
+def gate(clock):
+    return make_gate(clock)
+
+
+def trip(gate):
+    for _ in range(gate.breaker_threshold):
+        with pytest.raises(TimeoutError):
+            gate.call(fail)
+
+
+def test_opens_after_threshold(gate):
+    with pytest.raises(TimeoutError):
+        gate.call(fail)
+    assert gate.status()['breaker'] == 'closed'
+
+    with pytest.raises(TimeoutError):
+        gate.call(fail)
+    assert gate.status()['breaker'] == 'open'
+
+    with pytest.raises(LettaUnavailable) as e:
+        gate.call(lambda: "ok")
+    assert e.value.retry_after == 30
+
+
+def test_success_resets_failure_count(gate):
+    with pytest.raises(TimeoutError):
+        gate.call(fail)
+    assert gate.call(lambda: "ok") == "ok"
+    with pytest.raises(TimeoutError):
+        gate.call(fail)
+    assert gate.status()['breaker'] == 'closed'
+
+
+def test_client_errors_not_counted(gate):
+    for _ in range(5):
+        with pytest.raises(ClientError):
+            gate.call(client_error)
+    assert gate.status()['consecutive_failures'] == 0
+    assert gate.status()['breaker'] == 'closed'
+
+
+def test_cooldown_allows_single_trial(clock):
+    gate = make_gate(clock, max_concurrency=2)
+    trip(gate)
+    clock.now += 31
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def trial():
+        started.set()
+        release.wait(1)
+        return "ok"
+
+    results = []
+    t = threading.Thread(target=lambda: results.append(gate.call(trial)))
+    t.start()
+    started.wait(1)
+    assert gate.status()['breaker'] == 'half_open'
+
+    with pytest.raises(LettaUnavailable, match="half-open"):
+        gate.call(lambda: "second")
+
+    release.set()
+    t.join()
+    assert results == ["ok"]
+    assert gate.status()['breaker'] == 'closed'
+
+
+def test_failed_trial_reopens(gate, clock):
+    trip(gate)
+    clock.now += 31
+    with pytest.raises(TimeoutError):
+        gate.call(fail)
+    assert gate.status()['breaker'] == 'open'
+    assert gate.retry_after() == 30
+
+
+def test_interrupted_trial_releases_slot(gate, clock):
+    trip(gate)
+    clock.now += 31
+
+    def abort():
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        gate.call(abort)
+    assert gate.status()['breaker'] == 'half_open'
+    assert gate.call(lambda: "ok") == "ok"
+    assert gate.status()['breaker'] == 'closed'
+
+
+def test_late_result_does_not_decide_half_open(gate, clock):
+    # A call admitted while closed finishes after the breaker went half-open
+    assert gate._allow() is False
+    trip(gate)
+    clock.now += 31
+    assert gate._allow() is True
+
+    gate._record(True, is_trial=False)
+    assert gate.status()['breaker'] == 'half_open'
+    assert gate._trial_in_flight
+
+    gate._record(False, is_trial=True)
+    assert gate.status()['breaker'] == 'open'
+
+
+def test_queue_full_rejected_with_retry_after(gate):
+    gate._pending = gate.max_concurrency + gate.max_queue
+    with pytest.raises(LettaUnavailable, match="Too many pending") as e:
+        gate.call(lambda: "ok")
+    assert e.value.retry_after == 1
+
+
+def test_slot_wait_times_out(gate):
+    gate._slots.acquire()
+    with pytest.raises(LettaUnavailable, match="free agent slot"):
+        gate.call(lambda: "ok")
+    assert gate.status()['in_flight'] == 0
+
+
+@pytest.mark.parametrize("slots", [1, 2])
+def test_check_worker_config_rejects_too_few_threads(gate, slots):
+    with pytest.raises(RuntimeError, match="--threads 4"):
+        gate.check_worker_config(slots)
+
+
+def test_check_worker_config_accepts_spare_threads(gate):
+    gate.check_worker_config(3)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from profiling import ProfileStore, StackSampler
+
+
+def busy_leaf(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def busy_root(stop):
+    busy_leaf(stop)
+
+
+def other_request(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_records_only_target_thread():
+    stop = threading.Event()
+    target = threading.Thread(target=busy_root, args=(stop,))
+    other = threading.Thread(target=other_request, args=(stop,))
+    target.start()
+    other.start()
+
+    sampler = StackSampler(target.ident, interval=0.001)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    target.join()
+    other.join()
+
+    assert sampler.samples > 0
+    collapsed = sampler.collapsed()
+    assert "busy_root" in collapsed and "busy_leaf" in collapsed
+    assert "other_request" not in collapsed
+
+    # Collapsed format: "root;...;leaf count", callers before callees
+    line = next(l for l in collapsed.splitlines() if "busy_leaf" in l)
+    stack, count = line.rsplit(" ", 1)
+    assert int(count) > 0
+    names = [frame.split(" (")[0] for frame in stack.split(";")]
+    assert names.index("busy_root") < names.index("busy_leaf")
+
+    assert "busy_leaf" in sampler.summary()
+
+
+def test_sampler_with_no_samples():
+    sampler = StackSampler(threading.get_ident(), interval=10)
+    sampler.start()
+    sampler.stop()
+    assert sampler.samples == 0
+    assert sampler.collapsed() == ""
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path), size=3)
+
+
+def test_store_round_trip(store):
+    profile_id = store.save({'path': '/tasks', 'summary': 's', 'stacks': 'a;b 1'})
+    entry = store.get(profile_id)
+    assert entry['path'] == '/tasks'
+    assert entry['id'] == profile_id
+    assert store.list() == [{'path': '/tasks', 'id': profile_id}]
+
+
+def test_store_keeps_newest(store):
+    ids = [store.save({'n': n}) for n in range(5)]
+    assert [e['n'] for e in store.list()] == [4, 3, 2]
+    assert store.get(ids[0]) is None
+
+
+def test_store_shared_between_instances(store):
+    # Each worker has its own ProfileStore over the same directory
+    other = ProfileStore(store.directory, size=3)
+    profile_id = other.save({'n': 1})
+    assert store.get(profile_id)['n'] == 1
+
+
+@pytest.mark.parametrize("bad_id", ["../etc/passwd", "nope", ""])
+def test_store_rejects_bad_ids(store, bad_id):
+    assert store.get(bad_id) is None
@@ -0,0 +1,77 @@
+import pytest
+
+from search_index import SearchIndex, stem, tokenize
+
+
+@pytest.mark.parametrize("a, b", [
+    ("meetings", "meeting"),
+    ("shopping", "shop"),
+    ("groceries", "grocery"),
+    ("notes", "note"),
+    ("dentists", "dentist"),
+    ("baked", "bake"),
+    ("speeding", "speed"),
+    ("breeding", "breed"),
+    ("seeded", "seed"),
+    ("needed", "need"),
+    ("agreed", "agree"),
+    ("embedding", "embed"),
+    ("stopped", "stop"),
+])
+def test_stem_variants_match(a, b):
+    assert stem(a) == stem(b)
+
+
+def test_stem_keeps_short_eed_words():
+    assert stem("speed") == "speed"
+    assert stem("seed") == "seed"
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("Find anything about the Dentist") == ["dentist"]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add('folder', 'health', 'Health')
+    index.add('task', 't1', 'Dentist appointment', 'health')
+    index.add('task', 't2', 'Grocery shopping', 'home')
+    index.add('task', 't3', 'Call dentist about cleaning', 'health')
+    index.add('task', 't4', 'Speed test', 'home')
+    return index
+
+
+def test_search_matches_stemmed_forms(index):
+    assert [r['id'] for r in index.search("speeding")] == ['t4']
+    assert [r['id'] for r in index.search("groceries")] == ['t2']
+
+
+def test_search_ranks_shorter_names_first(index):
+    results = index.search("the dentist")
+    assert [r['id'] for r in results] == ['t1', 't3']
+    assert results[0]['score'] > results[1]['score']
+    assert results[0]['folder_name'] == 'Health'
+
+
+def test_search_prefix_match(index):
+    assert [r['id'] for r in index.search("dent")] == ['t1', 't3']
+
+
+def test_search_finds_folders(index):
+    top = index.search("health")[0]
+    assert (top['type'], top['id'], top['folder']) == ('folder', 'health', None)
+
+
+def test_remove_and_readd(index):
+    index.remove('task', 't1')
+    assert [r['id'] for r in index.search("dentist")] == ['t3']
+    assert 'appointment' not in index.postings
+
+    index.add('task', 't3', 'Call orthodontist', 'health')
+    assert index.search("dentist") == []
+
+
+def test_search_empty_query(index):
+    assert index.search("the") == []
+    assert index.search("") == []